@@ -0,0 +1,165 @@
+#!/bin/env python3
+# vi:ai:sw=4 ts=4 et
+
+import day01_a
+import day01_b
+from trie_01 import Searcher
+
+import argparse
+import json
+import random
+import string
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+WORDS = ["one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
+OVERLAPS = ["twone", "oneight", "eightwo", "eighthree", "sevenine", "threeight"]
+
+
+def generateCalibrations(
+    lines: int,
+    length: int = 40,
+    density: float = 0.2,
+    overlaps: float = 0.25,
+    seed: int = 1,
+) -> bytes:
+    """Synthetic calibration document, one numeral guaranteed on every line
+
+    density is the chance that each token is a digit word rather than a
+    letter or numeral, and overlaps the share of those words that run into
+    each other, eg. "twone".
+
+    >>> generateCalibrations(3, length=10, seed=2).count(b"\\n")
+    3
+    """
+    rng = random.Random(seed)
+    result: List[str] = []
+
+    for _ in range(lines):
+        tokens: List[str] = [rng.choice(string.digits[1:])]
+        size = 1
+        while size < length:
+            roll = rng.random()
+            if roll < density * overlaps:
+                token = rng.choice(OVERLAPS)
+            elif roll < density:
+                token = rng.choice(WORDS)
+            elif roll < density + (1 - density) / 10:
+                token = rng.choice(string.digits[1:])
+            else:
+                token = rng.choice(string.ascii_lowercase)
+            tokens.append(token)
+            size += len(token)
+
+        rng.shuffle(tokens)
+        result.append("".join(tokens))
+        result.append("\n")
+
+    return "".join(result).encode()
+
+
+def searcherCalibrations(lines: List[str]) -> int:
+    """The original per-character echelon, as a baseline"""
+    total = 0
+    for line in lines:
+        digits: List[int] = []
+        s = Searcher(day01_b.isdigit.trie)
+        for c in line:
+            s.advance(c)
+            okv = s.value()
+            if okv is not None:
+                digits.append(okv[1])
+        total += (10 * digits[0]) + digits[-1]
+    return total
+
+
+# each matcher takes the document as bytes and as a list of lines
+MATCHERS: Dict[str, Callable[[bytes, List[str]], int]] = {
+    "day01_a.sum_calibrations": lambda data, lines: day01_a.sum_calibrations(lines),
+    "day01_a.sum_calibration_buffer": lambda data, lines: (
+        day01_a.sum_calibration_buffer(data)
+    ),
+    "day01_b.searcher": lambda data, lines: searcherCalibrations(lines),
+    "day01_b.sumCalibrations": lambda data, lines: day01_b.sumCalibrations(lines),
+    "day01_b.sumCalibrationBuffer": lambda data, lines: (
+        day01_b.sumCalibrationBuffer(data)
+    ),
+}
+
+
+def measure(
+    matcher: Callable[[bytes, List[str]], int], data: bytes, repeat: int
+) -> Dict[str, Any]:
+    lines = data.decode().splitlines()
+
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = matcher(data, lines)
+        best = min(best, time.perf_counter() - begin)
+
+    # a separate run, since tracing skews the timings
+    tracemalloc.start()
+    matcher(data, lines)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "result": result,
+        "seconds": best,
+        "lines_per_second": len(lines) / best,
+        "mb_per_second": len(data) / best / 1e6,
+        "peak_bytes": peak,
+    }
+
+
+def revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--length", type=int, default=40, help="characters per line")
+    parser.add_argument("--density", type=float, default=0.2, help="digit words")
+    parser.add_argument("--overlaps", type=float, default=0.25)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", action="append", choices=sorted(MATCHERS))
+    parser.add_argument("--output", help="write the results here as JSON")
+    args = parser.parse_args()
+
+    data = generateCalibrations(
+        args.lines, args.length, args.density, args.overlaps, args.seed
+    )
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in args.only or MATCHERS:
+        results[name] = measure(MATCHERS[name], data, args.repeat)
+        r = results[name]
+        print(
+            f"{name:32} {r['lines_per_second']:12.0f} lines/s"
+            f" {r['mb_per_second']:8.2f} MB/s {r['peak_bytes'] / 1e6:8.2f} MB peak"
+        )
+
+    if args.output:
+        report = {
+            "revision": revision(),
+            "parameters": vars(args),
+            "bytes": len(data),
+            "results": results,
+        }
+        with open(args.output, "w") as sink:
+            json.dump(report, sink, indent=2)
+
+
+if __name__ == "__main__":
+    main()
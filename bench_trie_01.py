@@ -0,0 +1,59 @@
+#!/bin/env python3
+# vi:ai:sw=4 ts=4 et
+
+from trie_01 import Trie
+
+import random
+import string
+import sys
+import time
+from typing import Any, Callable, List, Set, Tuple
+
+
+def randomItems(
+    count: int, length: int = 12, stems: int = 0, seed: int = 1
+) -> List[Tuple[str, int]]:
+    """Distinct fixed-length keys, so incremental add can build them too
+
+    With stems, every key starts with one of that many shared 48 character
+    prefixes, the case where compressed keys keep being expanded.
+    """
+    rng = random.Random(seed)
+    prefixes = [
+        "".join(rng.choices(string.ascii_lowercase, k=48)) for _ in range(stems)
+    ] or [""]
+
+    keys: Set[str] = set()
+    while len(keys) < count:
+        suffix = "".join(rng.choices(string.ascii_lowercase, k=length))
+        keys.add(rng.choice(prefixes) + suffix)
+    return [(key, value) for value, key in enumerate(keys)]
+
+
+def incremental(items: List[Tuple[str, int]]) -> Trie:
+    trie = Trie()
+    for key, value in items:
+        trie.add(key, value)
+    return trie
+
+
+def timed(build: Callable[[], Any]) -> float:
+    begin = time.perf_counter()
+    build()
+    return time.perf_counter() - begin
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10**5, 10**6]
+    for count in sizes:
+        for stems in (0, 100):
+            items = randomItems(count, stems=stems)
+            ordered = sorted(items)
+            print(f"{count=} {stems=}")
+            print(f"  add:         {timed(lambda: incremental(items)):.3f}s")
+            print(f"  from_items:  {timed(lambda: Trie.from_items(items)):.3f}s")
+            print(f"  from_sorted: {timed(lambda: Trie.from_sorted(ordered)):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
-import sys
+from shards import parallel_sum, read_shard, shard_ranges
+
+import argparse
+import re
+from typing import Tuple
 
 
 def recover_calibration(line: str) -> int:
@@ -19,12 +23,57 @@ def sum_calibrations(source) -> int:
     return sum(recover_calibration(line.strip()) for line in source)
 
 
+# every byte except the digits and newline, for bytes.translate to delete
+NON_DIGITS = bytes(b for b in range(256) if b not in b"0123456789\n")
+FIRST_DIGIT = re.compile(rb"^\d", re.MULTILINE)
+LAST_DIGIT = re.compile(rb"\d$", re.MULTILINE)
+
+
+def sum_calibration_buffer(buffer: bytes) -> int:
+    r"""Sum the calibrations of a whole buffer without looping over lines
+
+    Dropping everything but digits and newlines leaves each line's first and
+    last digit at its ends, where two multiline searches pick them out.  The
+    work stays in C, and a line without digits simply counts as zero.
+
+    >>> sum_calibration_buffer(b"1abc2\npqr3stu8vwx\na1b2c3d4e5f\ntreb7uchet\n")
+    142
+    """
+    digits = buffer.translate(None, NON_DIGITS)
+    firsts = b"".join(FIRST_DIGIT.findall(digits))
+    lasts = b"".join(LAST_DIGIT.findall(digits))
+
+    zero = ord("0")
+    return (10 * (sum(firsts) - zero * len(firsts))) + sum(lasts) - zero * len(lasts)
+
+
+def sum_shard(shard: Tuple[str, int, int]) -> int:
+    """
+    >>> with open("day01-a-example-input.txt", "r") as source:
+    ...     serial = sum_calibrations(source)
+    >>> parallel_sum("day01-a-example-input.txt", sum_shard, jobs=2, size=8) == serial
+    True
+    """
+    return sum_calibration_buffer(read_shard(shard))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes")
+    parser.add_argument("filenames", nargs="*")
+    return parser.parse_args()
+
+
 def main():
-    for filename in sys.argv[1:]:
+    args = parse_args()
+    for filename in args.filenames:
         print(f"{filename=}")
-        with open(filename, "r") as source:
-            result = sum_calibrations(source)
-            print(f"{result=}")
+        if args.jobs > 1:
+            result = parallel_sum(filename, sum_shard, args.jobs)
+        else:
+            shards = shard_ranges(filename)
+            result = sum(sum_shard((filename, begin, end)) for begin, end in shards)
+        print(f"{result=}")
 
 
 if __name__ == "__main__":
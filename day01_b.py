@@ -1,9 +1,13 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
-from trie_01 import Trie, Searcher
+from day01_a import parse_args
+from shards import parallel_sum, read_shard
+from trie_01 import Automaton, Trie
 
-import sys
+from array import array
+import mmap
+import os
 
 from typing import Dict, List, Optional, Tuple
 
@@ -12,30 +16,52 @@ class Classifier:
     def __init__(self, svmap: Dict[str, int]):
         self.svmap = svmap
         self.trie = Trie()
+        self.reversed = Trie()
         for key, value in svmap.items():
             self.trie.add(key, value)
+            self.reversed.add(key[::-1], value)
+        self.automaton = Automaton(self.trie)
+        self.backward = Automaton(self.reversed)
 
-    def find_first(self, source: str) -> Optional[Tuple[str, int]]:
-        s = Searcher(self.trie)
-        for c in source:
-            s.advance(c)
-            okv = s.value()
-            if okv is not None:
-                return okv
-
-        return None
+        # byte-at-a-time tables for scanning whole buffers
+        self.table = self.automaton.table()
+        self.values = Classifier.outputs(self.automaton)
+        self.rtable = self.backward.table()
+        self.rvalues = Classifier.outputs(self.backward)
 
-    def find_all(self, source: str) -> List[int]:
-        digits: List[int] = []
+    @staticmethod
+    def outputs(automaton: Automaton) -> array:
+        return array("q", (0 if o is None else o[1] for o in automaton.output))
 
-        s = Searcher(self.trie)
-        for c in source:
-            s.advance(c)
-            okv = s.value()
-            if okv is not None:
-                digits.append(okv[1])
+    def find_first(self, source: str) -> Optional[Tuple[str, int]]:
+        return next(iter(self.automaton.matches(source)), None)
+
+    def find_last(self, source: str) -> Optional[Tuple[str, int]]:
+        """The match starting furthest right, scanning from the end"""
+        okv = next(iter(self.backward.matches(reversed(source))), None)
+        if okv is None:
+            return None
+        return (okv[0][::-1], okv[1])
+
+    def find_ends(self, source: str) -> Optional[Tuple[int, int]]:
+        """Values of the first and last matches, scanning in from both ends
+
+        >>> isdigit.find_ends("xtwone3fourhalf")
+        (2, 4)
+        >>> isdigit.find_ends("eightwo")
+        (8, 2)
+        >>> isdigit.find_ends("nothing") is None
+        True
+        """
+        first = self.find_first(source)
+        if first is None:
+            return None
+        last = self.find_last(source)
+        assert last is not None  # anything found forwards is found backwards
+        return (first[1], last[1])
 
-        return digits
+    def find_all(self, source: str) -> List[int]:
+        return [value for key, value in self.automaton.matches(source)]
 
 
 DIGITS = {
@@ -67,21 +93,119 @@ def recoverCalibration(line: str) -> int:
     12
     >>> recoverCalibration("treb7uchet")
     77
+    >>> recoverCalibration("zoneight")
+    18
     """
-    digits = isdigit.find_all(line)
-    return (10 * digits[0]) + digits[-1]
+    ends = isdigit.find_ends(line)
+    assert ends is not None
+    first, last = ends
+    return (10 * first) + last
 
 
 def sumCalibrations(source) -> int:
     return sum(recoverCalibration(line.strip()) for line in source)
 
 
+CHUNK = 1 << 20
+
+
+def countLines(buffer) -> int:
+    r"""
+    >>> countLines(b"a\nb\n")
+    2
+    >>> countLines(b"a\nb")
+    2
+    """
+    # count in bounded slices, so an mmap is never copied whole
+    count = sum(
+        buffer[i : i + CHUNK].count(b"\n") for i in range(0, len(buffer), CHUNK)
+    )
+    if len(buffer) and buffer[-1:] != b"\n":
+        count += 1
+    return count
+
+
+def scanCalibrations(buffer) -> array:
+    r"""First and last digit of every line, interleaved, straight from bytes
+
+    Works on bytes or an mmap without making a string per line: each line is
+    scanned in place, forwards to its first digit and backwards to its last,
+    with the matcher reset at every newline.  Lines without any digit, eg.
+    blank ones, come out as zeros.
+
+    >>> list(scanCalibrations(b"1abc2\ntreb7uchet\n\nzoneight"))
+    [1, 2, 7, 7, 0, 0, 1, 8]
+    """
+    table = isdigit.table
+    values = isdigit.values
+    rtable = isdigit.rtable
+    rvalues = isdigit.rvalues
+    ends = array("b", bytes(2 * countLines(buffer)))
+
+    first = 0
+    begin = 0
+    while begin < len(buffer):
+        end = buffer.find(b"\n", begin)
+        if end < 0:
+            end = len(buffer)
+
+        state = 0
+        for i in range(begin, end):
+            state = table[(state << 8) | buffer[i]]
+            if values[state]:
+                ends[first] = values[state]
+                break
+
+        if ends[first]:
+            state = 0
+            for i in range(end - 1, begin - 1, -1):
+                state = rtable[(state << 8) | buffer[i]]
+                if rvalues[state]:
+                    ends[first + 1] = rvalues[state]
+                    break
+
+        first += 2
+        begin = end + 1
+
+    return ends
+
+
+def sumCalibrationBuffer(buffer) -> int:
+    r"""
+    >>> sumCalibrationBuffer(b"1abc2\ntreb7uchet\n")
+    89
+    """
+    ends = scanCalibrations(buffer)
+    return (10 * sum(ends[0::2])) + sum(ends[1::2])
+
+
+def sumCalibrationFile(filename: str) -> int:
+    if os.path.getsize(filename) == 0:
+        return 0  # mmap refuses empty files
+
+    with open(filename, "rb") as source:
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return sumCalibrationBuffer(buffer)
+
+
+def sumCalibrationShard(shard: Tuple[str, int, int]) -> int:
+    """
+    >>> serial = sumCalibrationFile("day01-a-example-input.txt")
+    >>> parallel_sum("day01-a-example-input.txt", sumCalibrationShard, 2, 8) == serial
+    True
+    """
+    return sumCalibrationBuffer(read_shard(shard))
+
+
 def main():
-    for filename in sys.argv[1:]:
+    args = parse_args()
+    for filename in args.filenames:
         print(f"{filename=}")
-        with open(filename, "r") as source:
-            result = sumCalibrations(source)
-            print(f"{result=}")
+        if args.jobs > 1:
+            result = parallel_sum(filename, sumCalibrationShard, args.jobs)
+        else:
+            result = sumCalibrationFile(filename)
+        print(f"{result=}")
 
 
 if __name__ == "__main__":
@@ -1,64 +1,173 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
 from collections.abc import Iterable
+import itertools
+import operator
 import re
 import sys
-from typing import Tuple
-
-
-class Game:
-    def __init__(self, line: str):
-        line = line.strip()
-        head, body = line.split(":")
-        self.id = int(head.split(" ")[1])
-        self.maxbrg = Game.maxima(body)
-
-        print(f"{line} -> max:{self.maxbrg}")
-
-    @staticmethod
-    def search(name: str, sample: str) -> int:
-        m = re.search(rf"(\d*) {name}", sample)
-        if m:
-            return int(m.group(1))
-        else:
-            return 0
-
-    @staticmethod
-    def parse(body: str) -> Iterable[Tuple[int, int, int]]:
-        for sample in body.split(";"):
-            yield (
-                Game.search("blue", sample),
-                Game.search("red", sample),
-                Game.search("green", sample),
-            )
+from typing import Dict, List, Tuple
+
+
+class Games:
+    """Every game's id and maximum blue, red and green, as parallel columns
+
+    >>> games = Games.load(["Game 1: 3 blue, 4 red; 1 red, 2 green, 6 blue\\n",
+    ...                     "Game 2: 1 blue, 2 green; 3 green, 4 blue, 1 red\\n"])
+    >>> list(games.ids), list(games.blue), list(games.red), list(games.green)
+    ([1, 2], [6, 4], [4, 1], [2, 3])
+    >>> list(games.possible(5, 12, 13))
+    [2]
+    >>> list(games.powers())
+    [48, 12]
+    """
+
+    TOKENS = re.compile(r"Game (\d+)|(\d+) (blue|red|green)")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.blue = array("q")
+        self.red = array("q")
+        self.green = array("q")
+
+    @classmethod
+    def load(cls, source: Iterable[str]) -> Games:
+        """Tokenize a whole game log in one pass, with no per-game objects"""
+        games = cls()
+        columns: Dict[str, array] = {
+            "blue": games.blue,
+            "red": games.red,
+            "green": games.green,
+        }
+
+        for m in cls.TOKENS.finditer("".join(source)):
+            gameid, count, name = m.groups()
+            if gameid is not None:
+                games.ids.append(int(gameid))
+                for column in columns.values():
+                    column.append(0)
+            else:
+                column = columns[name]
+                column[-1] = max(column[-1], int(count))
+
+        return games
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def possible(self, blue: int, red: int, green: int) -> Iterable[int]:
+        """Ids of the games a bag of this many cubes could have produced"""
+        fits = map(
+            operator.and_,
+            map(operator.and_, self.fits(self.blue, blue), self.fits(self.red, red)),
+            self.fits(self.green, green),
+        )
+        return itertools.compress(self.ids, fits)
 
     @staticmethod
-    def maxima(body: str) -> Tuple[int, int, int]:
-        maxblue: int = 0
-        maxred: int = 0
-        maxgreen: int = 0
-
-        for b, r, g in Game.parse(body):
-            maxblue = max(maxblue, b)
-            maxred = max(maxred, r)
-            maxgreen = max(maxgreen, g)
-
-        return (maxblue, maxred, maxgreen)
+    def fits(column: array, needed: int) -> Iterable[bool]:
+        return map(operator.le, column, itertools.repeat(needed))
+
+    def powers(self) -> Iterable[int]:
+        return map(operator.mul, map(operator.mul, self.blue, self.red), self.green)
+
+
+class GameIndex:
+    """Answers many "which games fit this bag?" questions about one game set
+
+    Games are kept sorted by blue, and a batch of bags is answered offline in
+    order of blue: as the blue limit rises, games are added to a Fenwick tree
+    over red whose every node holds a Fenwick tree over just the greens that
+    can reach it.  Space is O(n log n) in the number of games, however spread
+    out their counts, and each game or bag costs O(log² n).
+
+    >>> with open("day02-a-example-input.txt", "r") as source:
+    ...     games = Games.load(source)
+    >>> index = GameIndex(games)
+    >>> index.query(14, 12, 13)
+    (8, 3)
+    >>> index.query(14, 12, 13)[0] == sum(games.possible(14, 12, 13))
+    True
+    >>> index.queries([(0, 0, 0), (100, 100, 100), (6, 20, 13)])
+    [(0, 0), (15, 5), (11, 4)]
+    """
+
+    def __init__(self, games: Games):
+        order = sorted(range(len(games)), key=games.blue.__getitem__)
+        self.blue = array("q", (games.blue[i] for i in order))
+        self.reds: List[int] = sorted(set(games.red))
+
+        # (red position counting from 1, green, id) for each game, by blue
+        self.entries: List[Tuple[int, int, int]] = [
+            (bisect_left(self.reds, games.red[i]) + 1, games.green[i], games.ids[i])
+            for i in order
+        ]
+
+        # the greens each node of the red tree will ever hold
+        greens: List[List[int]] = [[] for _ in range(len(self.reds) + 1)]
+        for r, g, _ in self.entries:
+            while r < len(greens):
+                greens[r].append(g)
+                r += r & -r
+        self.greens = [array("q", sorted(set(node))) for node in greens]
+
+    def query(self, blue: int, red: int, green: int) -> Tuple[int, int]:
+        """(sum, count) of the ids of games possible with these many cubes
+
+        This is a batch of one, so ask queries() for many bags at once.
+        """
+        return self.queries([(blue, red, green)])[0]
+
+    def queries(self, bags: Iterable[Tuple[int, int, int]]) -> List[Tuple[int, int]]:
+        bags = list(bags)
+        sums = [array("q", bytes(8 * (len(node) + 1))) for node in self.greens]
+        counts = [array("q", bytes(8 * (len(node) + 1))) for node in self.greens]
+
+        results: List[Tuple[int, int]] = [(0, 0)] * len(bags)
+        added = 0
+        for k in sorted(range(len(bags)), key=lambda k: bags[k][0]):
+            blue, red, green = bags[k]
+            while added < len(self.blue) and self.blue[added] <= blue:
+                self.add(sums, counts, *self.entries[added])
+                added += 1
+            results[k] = self.total(sums, counts, red, green)
+
+        return results
+
+    def add(self, sums: List[array], counts: List[array], r: int, g: int, gameid: int):
+        while r < len(self.greens):
+            node = self.greens[r]
+            j = bisect_left(node, g) + 1
+            while j <= len(node):
+                sums[r][j] += gameid
+                counts[r][j] += 1
+                j += j & -j
+            r += r & -r
+
+    def total(
+        self, sums: List[array], counts: List[array], red: int, green: int
+    ) -> Tuple[int, int]:
+        total = 0
+        count = 0
+        r = bisect_right(self.reds, red)
+        while r > 0:
+            j = bisect_right(self.greens[r], green)
+            while j > 0:
+                total += sums[r][j]
+                count += counts[r][j]
+                j -= j & -j
+            r -= r & -r
+        return (total, count)
 
 
 def filterGames(
     source: Iterable[str], blue: int, red: int, green: int
 ) -> Iterable[int]:
-    games = (Game(line) for line in source)
-
-    def possible(game: Game) -> bool:
-        return all(
-            maximum <= needed
-            for maximum, needed in zip(game.maxbrg, (blue, red, green))
-        )
-
-    return (game.id for game in filter(possible, games))
+    return Games.load(source).possible(blue, red, green)
 
 
 def solve(blue: int, red: int, green: int):
@@ -1,10 +1,17 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
-from collections.abc import Iterable
+import argparse
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Callable, Iterable
+import itertools
+import multiprocessing
+from multiprocessing.pool import AsyncResult
+import os
 import re
-import sys
-from typing import List, Set, Tuple
+from typing import Deque, List, Optional, Set, Tuple
 
 
 def matchpos(line: str, pattern: re.Pattern) -> Iterable[Tuple[int, int, str]]:
@@ -13,54 +20,186 @@ def matchpos(line: str, pattern: re.Pattern) -> Iterable[Tuple[int, int, str]]:
         yield (m.start(), m.end(), m.group())
 
 
+class Schematic:
+    """Every symbol and number, with each digit cell mapped to its number
+
+    rows[y][x] is the id of the number covering that cell, or -1, so anything
+    adjacent to a symbol is found by looking at just its 3x3 neighbourhood.
+    """
+
+    NUMBER = re.compile(r"\d+")
+    SYMBOL = re.compile("[^ .0-9]")
+
+    def __init__(self, source: Iterable[str]):
+        self.numbers: List[int] = []
+        self.symbols: List[Tuple[int, int, str]] = []
+        self.rows: List[array] = []
+
+        for lineno, line in enumerate(source):
+            line = line.strip()
+            for start, end, sym in matchpos(line, Schematic.SYMBOL):
+                self.symbols.append((start, lineno, sym))
+
+            row = array("q", [-1]) * len(line)
+            for start, end, numstr in matchpos(line, Schematic.NUMBER):
+                row[start:end] = array("q", [len(self.numbers)]) * (end - start)
+                self.numbers.append(int(numstr))
+            self.rows.append(row)
+
+    def neighbours(self, xx: int, yy: int) -> Set[int]:
+        """Ids of the numbers touching a cell, diagonals included"""
+        found: Set[int] = set()
+        for row in self.rows[max(yy - 1, 0) : yy + 2]:
+            for number in row[max(xx - 1, 0) : xx + 2]:
+                if number >= 0:
+                    found.add(number)
+        return found
+
+
 def partnums(source: Iterable[str]) -> int:
-    """this is eager, ie, we find all numeral sequences and symbols first"""
-    # find positions of every symbol and number
-    numpat = re.compile(r"\d+")
-    sympat = re.compile("[^ .0-9]")
-
-    numbers: List[Tuple[int, int, int, int]] = []
-    symbols: Set[Tuple[int, int]] = set()
-
-    for lineno, line in enumerate(source):
-        line = line.strip()
-        for start, end, sym in matchpos(line, sympat):
-            symbols.add((start, lineno))
-            # print(f"symbol {sym} at {start},{lineno}")
-
-        for start, end, numstr in matchpos(line, numpat):
-            numbers.append((start, end, lineno, int(numstr)))
-            # print(f"number {numstr} at ({start}-{end}),{lineno}")
-
-    # now extract all the numbers adjacent to a symbol
-    partnums: List[int] = []
-
-    for xbegin, xend, yy, num in numbers:
-        if (xbegin - 1, yy) in symbols or (xend, yy) in symbols:
-            # same line -- $123$
-            partnums.append(num)
-            # print(f"{num} is on the same line as a symbol")
-        else:
-            # adjacent line:
-            # $....
-            # .123.
-            # ....$
-            for xx in range(xbegin - 1, xend + 1):
-                if (xx, yy - 1) in symbols:
-                    # print(f"{num} is adjacent to the symbol at {xx},{yy-1}")
-                    partnums.append(num)
-                    break
-                elif (xx, yy + 1) in symbols:
-                    # print(f"{num} is adjacent to the symbol at {xx},{yy+1}")
-                    partnums.append(num)
-                    break
-
-    return sum(partnums)
+    """
+    >>> with open("day03-a-example-input.txt", "r") as source:
+    ...     partnums(source)
+    4361
+    """
+    schematic = Schematic(source)
+
+    # a number touching several symbols is still only one part
+    parts: Set[int] = set()
+    for xx, yy, sym in schematic.symbols:
+        parts |= schematic.neighbours(xx, yy)
+
+    return sum(schematic.numbers[i] for i in parts)
+
+
+class Row:
+    """One stripped schematic line, with its numbers in column order"""
+
+    def __init__(self, line: str = ""):
+        self.line = line.strip()
+        self.spans: List[Tuple[int, int, int]] = [
+            (start, end, int(numstr))
+            for start, end, numstr in matchpos(self.line, Schematic.NUMBER)
+        ]
+        self.starts = [start for start, end, number in self.spans]
+
+    def touching(self, begin: int, end: int) -> Iterable[int]:
+        """Numbers with a digit somewhere in columns [begin, end)"""
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.spans[i][1] > begin:
+            yield self.spans[i][2]
+            i -= 1
+
+    def hasSymbol(self, begin: int, end: int) -> bool:
+        return Schematic.SYMBOL.search(self.line, max(begin, 0), end) is not None
+
+
+def rowWindows(source: Iterable[str]) -> Iterable[Tuple[Row, Row, Row]]:
+    """Each row with its neighbours above and below, blank beyond the edges"""
+    above = Row()
+    current: Optional[Row] = None
+    for line in source:
+        below = Row(line)
+        if current is not None:
+            yield (above, current, below)
+            above = current
+        current = below
+
+    if current is not None:
+        yield (above, current, Row())
+
+
+def streamPartnums(source: Iterable[str]) -> Iterable[int]:
+    """Part numbers, each emitted as soon as the row below it has been read
+
+    Only three rows are ever held, so memory doesn't grow with the height.
+
+    >>> with open("day03-a-example-input.txt", "r") as source:
+    ...     sum(streamPartnums(source))
+    4361
+    """
+    return windowPartnums(rowWindows(source))
+
+
+def windowPartnums(windows: Iterable[Tuple[Row, Row, Row]]) -> Iterable[int]:
+    for above, row, below in windows:
+        for start, end, number in row.spans:
+            if any(r.hasSymbol(start - 1, end + 1) for r in (above, row, below)):
+                yield number
+
+
+BAND_ROWS = 10000
+BANDS_AHEAD = 2
+
+Band = Tuple[List[str], int, int]
+
+
+def bands(source: Iterable[str], size: int = BAND_ROWS) -> Iterable[Band]:
+    """Runs of size rows, with one row of halo above and below where there is one
+
+    Each band is (rows, begin, end), and only rows[begin:end] belong to it,
+    so anything attributed to the row it sits on is counted exactly once.
+
+    >>> list(bands("abcde", 2))
+    [(['a', 'b', 'c'], 0, 2), (['b', 'c', 'd', 'e'], 1, 3), (['d', 'e'], 1, 2)]
+    """
+    lines = iter(source)
+    above: List[str] = []
+    owned = list(itertools.islice(lines, size))
+    while owned:
+        following = list(itertools.islice(lines, size))
+        yield (above + owned + following[:1], len(above), len(above) + len(owned))
+        above = owned[-1:]
+        owned = following
+
+
+def bandPartnums(band: Band) -> int:
+    rows, begin, end = band
+    return sum(windowPartnums(itertools.islice(rowWindows(rows), begin, end)))
+
+
+def parallelBands(
+    source: Iterable[str],
+    worker: Callable[[Band], int],
+    jobs: Optional[int] = None,
+    size: int = BAND_ROWS,
+) -> int:
+    """Sum a worker's results over every band, across a pool of processes
+
+    At most BANDS_AHEAD bands per process are in flight at any time.
+
+    >>> with open("day03-a-example-input.txt", "r") as source:
+    ...     parallelBands(source, bandPartnums, jobs=2, size=3)
+    4361
+    """
+    # only a few bands per worker are read ahead and queued at once, so
+    # memory stays bounded however tall the schematic is
+    limit = BANDS_AHEAD * (jobs or os.cpu_count() or 1)
+    pending: Deque[AsyncResult] = deque()
+    total = 0
+
+    with multiprocessing.Pool(jobs) as pool:
+        for band in bands(source, size):
+            if len(pending) >= limit:
+                total += pending.popleft().get()
+            pending.append(pool.apply_async(worker, (band,)))
+        return total + sum(result.get() for result in pending)
+
+
+def parseArgs() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes")
+    parser.add_argument("filename")
+    return parser.parse_args()
 
 
 def main():
-    with open(sys.argv[1], "r") as source:
-        result = partnums(source)
+    args = parseArgs()
+    with open(args.filename, "r") as source:
+        if args.jobs > 1:
+            result = parallelBands(source, bandPartnums, args.jobs)
+        else:
+            result = partnums(source)
         print(f"{result}")
 
 
@@ -1,64 +1,31 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
-from day03_a import matchpos
+from day03_a import Band, matchpos, parallelBands, parseArgs, Row, rowWindows
+from day03_a import Schematic
 
 from collections.abc import Iterable
+import itertools
 import re
-import sys
 from typing import List, Tuple
 
 
-def boxOverlaps(
-    point: Tuple[int, int], topleft: Tuple[int, int], botright: Tuple[int, int]
-) -> bool:
+def gearRatios(source: Iterable[str]) -> int:
     """
-    >>> boxOverlaps((0,0), (0,0), (3,3))
-    True
-    >>> boxOverlaps((0,0), (1,0), (3,3))
-    False
-    >>> boxOverlaps((1,1), (0,0), (3,3))
-    True
-    >>> boxOverlaps((3,3), (0,0), (3,2))
-    False
+    >>> with open("day03-a-example-input.txt", "r") as source:
+    ...     gearRatios(source)
+    467835
     """
-    left, top = topleft
-    right, bot = botright
-    pxx, pyy = point
-
-    if top <= pyy and pyy <= bot:
-        if left <= pxx and pxx <= right:
-            return True
-    return False
-
-
-def gearRatios(source: Iterable[str]) -> int:
-    numpat = re.compile(r"\d+")
-    sympat = re.compile("[^ .0-9]")
-
-    numbers: List[Tuple[int, int, int, int]] = []
-    symbols: List[Tuple[int, int]] = []
-
-    for lineno, line in enumerate(source):
-        line = line.strip()
-        for start, end, sym in matchpos(line, sympat):
-            if sym == "*":
-                symbols.append((start, lineno))
-                # print(f"gear at {start},{lineno}")
-
-        for start, end, numstr in matchpos(line, numpat):
-            numbers.append((start, end, lineno, int(numstr)))
-            # print(f"number {numstr} at ({start}-{end}),{lineno}")
+    schematic = Schematic(source)
 
     # now find all the symbols adjacent to exactly two numbers
     gears: List[int] = []
 
-    for sxx, syy in symbols:
-        found: List[int] = []
-        for nxbegin, nxend, nyy, num in numbers:
-            if boxOverlaps((sxx, syy), (nxbegin - 1, nyy - 1), (nxend, nyy + 1)):
-                found.append(num)
+    for sxx, syy, sym in schematic.symbols:
+        if sym != "*":
+            continue
 
+        found = [schematic.numbers[i] for i in schematic.neighbours(sxx, syy)]
         if len(found) == 2:
             # print(f"found exactly two numbers adjacent to {sxx},{syy}: {found}")
             gears.append(found[0] * found[1])
@@ -66,9 +33,45 @@ def gearRatios(source: Iterable[str]) -> int:
     return sum(gears)
 
 
+def streamGearRatios(source: Iterable[str]) -> Iterable[int]:
+    """Gear ratios, each emitted as soon as the row below the gear is read
+
+    >>> with open("day03-a-example-input.txt", "r") as source:
+    ...     sum(streamGearRatios(source))
+    467835
+    """
+    return windowGearRatios(rowWindows(source))
+
+
+def windowGearRatios(windows: Iterable[Tuple[Row, Row, Row]]) -> Iterable[int]:
+    gearpat = re.compile(r"\*")
+
+    for above, row, below in windows:
+        for start, end, sym in matchpos(row.line, gearpat):
+            found = [
+                n for r in (above, row, below) for n in r.touching(start - 1, end + 1)
+            ]
+            if len(found) == 2:
+                yield found[0] * found[1]
+
+
+def bandGearRatios(band: Band) -> int:
+    """
+    >>> with open("day03-a-example-input.txt", "r") as source:
+    ...     parallelBands(source, bandGearRatios, jobs=2, size=1)
+    467835
+    """
+    rows, begin, end = band
+    return sum(windowGearRatios(itertools.islice(rowWindows(rows), begin, end)))
+
+
 def main():
-    with open(sys.argv[1], "r") as source:
-        result = gearRatios(source)
+    args = parseArgs()
+    with open(args.filename, "r") as source:
+        if args.jobs > 1:
+            result = parallelBands(source, bandGearRatios, args.jobs)
+        else:
+            result = gearRatios(source)
         print(f"{result}")
 
 
@@ -1,41 +1,204 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
+from array import array
 from collections.abc import Iterable
+import mmap
+import os
 import sys
-from typing import Set
+from typing import List
 
 
-def matchCard(line: str) -> int:
-    name, numbers = line.split(":")
-    winstr, actstr = numbers.split("|")
-
-    winning: Set[int] = set((int(i) for i in winstr.split()))
-    actual: Set[int] = set((int(i) for i in actstr.split()))
-
-    matched = winning & actual
+def bitmask(numbers: str) -> int:
+    """Card numbers are small, so a set of them fits in one int
 
-    return len(matched)
+    >>> bin(bitmask(" 1  3 4 "))
+    '0b11010'
+    """
+    mask = 0
+    for i in numbers.split():
+        mask |= 1 << int(i)
+    return mask
 
 
-def scoreCard(line: str) -> int:
-    nmatched = matchCard(line)
-
-    if nmatched > 0:
-        return 2 ** (nmatched - 1)
+def matchCard(line: str) -> int:
+    """
+    >>> matchCard("Card 1: 41 48 83 86 17 | 83 86  6 31 17  9 48 53")
+    4
+    """
+    name, numbers = line.split(":")
+    winstr, actstr = numbers.split("|")
 
-    return 0
+    matched = bitmask(winstr) & bitmask(actstr)
+
+    return matched.bit_count()
+
+
+def matchCards(source: Iterable[str]) -> array:
+    """Every card's match count, in order"""
+    return array("q", map(matchCard, source))
+
+
+def scoreMatches(matches: Iterable[int]) -> int:
+    """
+    >>> scoreMatches([4, 2, 2, 1, 0, 0])
+    13
+    """
+    # no matches scores nothing, then each one doubles the score
+    return sum((1 << nmatched) >> 1 for nmatched in matches)
+
+
+class CardTable:
+    """A scratchcard file viewed as a grid of bytes, one fixed-width row per card
+
+    Every row must share the first one's layout: the ":" and "|" in the same
+    columns, then right-aligned two digit fields, three columns apart.  A
+    field's bytes are then one strided column across all cards, and columns
+    are compared whole, as big ints holding a byte lane per card.
+
+    >>> with open("day04-example-input.txt", "rb") as source:
+    ...     table = CardTable(source.read())
+    >>> list(table.matches())
+    [4, 2, 2, 1, 0, 0]
+    >>> list(table.values(table.winning[0]).to_bytes(table.rows, "little"))
+    [41, 13, 1, 41, 87, 31]
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        try:
+            self.layout()
+        except BaseException:
+            self.release()
+            raise
+
+    def __enter__(self) -> "CardTable":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def release(self) -> None:
+        """Let go of the buffer, so a mapped file can be closed"""
+        self.view.release()
+
+    def layout(self) -> None:
+        end = self.buffer.find(b"\n")
+        if end < 0:
+            end = len(self.buffer)  # a lone card, with no newline at all
+        first = bytes(self.view[:end]) + b"\n"
+        self.stride = len(first)
+        # the last newline is optional
+        self.rows = (len(self.buffer) + 1) // self.stride
+        if self.rows * self.stride - len(self.buffer) not in (0, 1):
+            raise ValueError("rows are not all the same width")
+
+        colon = first.find(b":")
+        bar = first.find(b"|")
+        if colon < 0 or bar < colon:
+            raise ValueError("not a scratchcard table")
+
+        # offsets of the tens digit of every field
+        self.winning: List[int] = list(range(colon + 2, bar - 1, 3))
+        self.actual: List[int] = list(range(bar + 2, self.stride - 2, 3))
+        if len(self.winning) > 0xFF:
+            raise ValueError("too many winning numbers to count in a byte")
+
+        separators = [(colon, b":"), (bar, b"|")]
+        separators += [(i - 1, b" ") for i in self.winning + self.actual + [bar]]
+        for offset, expect in separators:
+            if self.column(offset) != expect * self.rows:
+                raise ValueError(f"column {offset} is not all {expect!r}")
+        if self.column(self.stride - 1)[: self.rows - 1] != b"\n" * (self.rows - 1):
+            raise ValueError("rows are not all the same width")
+
+        self.lanes = (1 << (8 * self.rows)) - 1
+        self.low = self.lanes // 0xFF * 0x7F  # 0x7f in every lane
+        self.high = self.lanes // 0xFF * 0x80
+
+    def column(self, offset: int) -> bytes:
+        return bytes(self.view[offset :: self.stride][: self.rows])
+
+    def lane(self, offset: int) -> int:
+        return int.from_bytes(self.column(offset), "little")
+
+    def values(self, field: int) -> int:
+        """Every card's number in one field, as a byte lane per card
+
+        A whole column is checked and decoded at a time.
+        """
+        tens = self.column(field)
+        units = self.column(field + 1)
+        if tens.translate(None, b" 0123456789") or units.translate(None, b"0123456789"):
+            raise ValueError(f"column {field} is not all numbers")
+
+        # " " and "0" both count for nothing, with no carry between lanes
+        zeros = self.lanes // 0xFF * ord("0")
+        high = int.from_bytes(tens, "little") | (self.lanes // 0xFF * 0x10)
+        return 10 * (high - zeros) + int.from_bytes(units, "little") - zeros
+
+    def equal(self, a: int, b: int) -> int:
+        """1 in every lane where two fields hold the same number, else 0"""
+        differ = a ^ b
+        # set the top bit of each lane holding anything but zero
+        nonzero = (((differ & self.low) + self.low) | differ) & self.high
+        return (nonzero ^ self.high) >> 7
+
+    def matches(self) -> bytes:
+        """Every card's match count, one byte per card
+
+        As in matchCard, a number counts once however often it's repeated.
+        Only the actual numbers are held throughout; each winning field is
+        decoded when it's needed and dropped again.
+
+        >>> list(CardTable(b"Card 1: 41 41 | 83 41").matches())
+        [1]
+        """
+        actual = [self.values(i) for i in self.actual]
+
+        counts = 0
+        for n, offset in enumerate(self.winning):
+            field = self.values(offset)
+            found = 0
+            for other in actual:
+                found |= self.equal(field, other)
+            for earlier in self.winning[:n]:
+                if not found:
+                    break
+                found &= ~self.equal(field, self.values(earlier))
+            counts += found
+
+        return counts.to_bytes(self.rows, "little")
+
+
+def fileMatches(filename: str) -> Iterable[int]:
+    """Match counts straight from the mapped file, if its rows are fixed-width"""
+    if os.path.getsize(filename) > 0:
+        with open(filename, "rb") as source:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                try:
+                    with CardTable(buffer) as table:
+                        return table.matches()
+                except ValueError:
+                    pass  # parse it line by line instead
+
+    with open(filename, "r") as source:
+        return matchCards(source)
 
 
 def scoreCards(source: Iterable[str]) -> int:
-    scores = (scoreCard(line) for line in source)
-    return sum(scores)
+    """
+    >>> with open("day04-example-input.txt", "r") as source:
+    ...     scoreCards(source)
+    13
+    """
+    return scoreMatches(matchCards(source))
 
 
 def main():
-    with open(sys.argv[1], "r") as source:
-        result = scoreCards(source)
-        print(f"{result}")
+    result = scoreMatches(fileMatches(sys.argv[1]))
+    print(f"{result}")
 
 
 if __name__ == "__main__":
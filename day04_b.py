@@ -1,31 +1,194 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
 
-from day04_a import matchCard
+from day04_a import CardTable, fileMatches, matchCard, matchCards
+from shards import read_shard, shard_ranges, shard_size
 
-from collections import defaultdict
-from collections.abc import Iterable
-import sys
-from typing import Dict
+import argparse
+from collections import deque
+from collections.abc import Iterable, Sequence
+import multiprocessing
+import operator
+from typing import Deque, List, Optional, Tuple
 
 
 def countCards(source: Iterable[str]) -> int:
-    # map row number to count, everything starts at 1
-    counts: Dict[int, int] = defaultdict(lambda: 1)
+    """
+    >>> with open("day04-example-input.txt", "r") as source:
+    ...     countCards(source)
+    30
+    """
+    return countMatches(map(matchCard, source))
 
-    for num, line in enumerate(source):
-        mult = counts[num]
-        nmatched = matchCard(line)
-        for extra in range(num + 1, num + 1 + nmatched):
-            counts[extra] += mult
 
-    return sum(counts.values())
+def countMatches(matches: Iterable[int]) -> int:
+    """Total cards won, given every card's match count in order
+
+    >>> countMatches([4, 2, 2, 1, 0, 0])
+    30
+    """
+    # a difference array of extra copies: pending[k] is the change k + 1 rows
+    # on, and it's only ever as long as the furthest any card reaches
+    pending: Deque[int] = deque()
+    extra = 0
+    total = 0
+
+    for nmatched in matches:
+        if pending:
+            extra += pending.popleft()
+        mult = 1 + extra
+        total += mult
+
+        if nmatched:
+            while len(pending) <= nmatched:
+                pending.append(0)
+            pending[0] += mult
+            pending[nmatched] -= mult
+
+    return total
+
+
+# an affine function of a chunk's carry-in: [constant, coefficient...]
+Affine = List[int]
+
+
+def vadd(a: Affine, b: Affine) -> Affine:
+    return list(map(operator.add, a, b))
+
+
+def cascadeEffect(matches: Sequence[int], width: int) -> Tuple[Affine, List[Affine]]:
+    """A run of the cascade, as a function of the copies carried into it
+
+    Copies arriving from earlier runs can only land on the first width
+    rows, and everything downstream is linear in them.  So running the
+    difference array with affine vectors instead of plain counts gives the
+    run's total, and the extra copies it passes to each of the next width
+    rows, for whatever the earlier runs turn out to send.  Carries meant
+    for rows past a short run's end are passed straight through.
+    """
+    zero = [0] * (width + 1)
+    pending: Deque[Affine] = deque()
+    extra = zero
+    total = zero
+
+    for row, nmatched in enumerate(matches):
+        if pending:
+            extra = vadd(extra, pending.popleft())
+        mult = list(extra)
+        mult[0] += 1
+        if row < width:
+            mult[row + 1] += 1  # this row's carry-in
+        total = vadd(total, mult)
+
+        if nmatched:
+            while len(pending) <= nmatched:
+                pending.append(zero)
+            pending[0] = vadd(pending[0], mult)
+            pending[nmatched] = list(map(operator.sub, pending[nmatched], mult))
+
+    carry: List[Affine] = []
+    for row in range(len(matches), len(matches) + width):
+        if pending:
+            extra = vadd(extra, pending.popleft())
+        out = list(extra)
+        if row < width:
+            out[row + 1] += 1
+        carry.append(out)
+
+    return (total, carry)
+
+
+def shardMatches(shard: Tuple[str, int, int]) -> Sequence[int]:
+    """Match counts for the cards in one byte range of a file"""
+    buffer = read_shard(shard)
+    try:
+        with CardTable(buffer) as table:
+            return table.matches()
+    except ValueError:
+        return matchCards(buffer.decode().splitlines())
+
+
+def chunkEffect(task: Tuple[str, int, int, int]) -> Tuple[Affine, List[Affine], int]:
+    """Parse one shard of cards and summarise its part of the cascade
+
+    >>> total, carry, widest = chunkEffect(("day04-example-input.txt", 0, 49, 4))
+    >>> total, carry[:2], widest
+    ([1, 1, 0, 0, 0], [[1, 1, 1, 0, 0], [1, 1, 0, 1, 0]], 4)
+    """
+    filename, begin, end, width = task
+    matches = shardMatches((filename, begin, end))
+    total, carry = cascadeEffect(matches, width)
+    return (total, carry, max(matches, default=0))
+
+
+def firstCardWidth(filename: str) -> int:
+    """How many winning numbers the first card has, so the most it can match"""
+    with open(filename, "r") as source:
+        first = source.readline()
+    if "|" not in first:
+        return 0
+    return len(first.split(":")[-1].split("|")[0].split())
+
+
+def parallelCountMatches(
+    filename: str, jobs: Optional[int] = None, size: Optional[int] = None
+) -> int:
+    """countMatches, with each shard of the file parsed and run by a worker
+
+    Each shard's effect is worked out independently, then a second pass
+    over the compact summaries threads the real carries through, as in a
+    parallel prefix sum.  The summaries are sized for the first card's
+    winning numbers, and worked out again in the rare case a card matches
+    more than that.
+
+    >>> parallelCountMatches("day04-example-input.txt", jobs=2, size=40)
+    30
+    """
+    if size is None:
+        size = shard_size(filename, jobs)
+    shards = shard_ranges(filename, size)
+    width = firstCardWidth(filename)
+
+    with multiprocessing.Pool(jobs) as pool:
+        while True:
+            tasks = [(filename, begin, end, width) for begin, end in shards]
+            effects = pool.map(chunkEffect, tasks)
+            widest = max((w for _, _, w in effects), default=0)
+            if widest <= width:
+                break
+            width = widest
+
+    def apply(f: Affine, carry: List[int]) -> int:
+        return f[0] + sum(map(operator.mul, f[1:], carry))
+
+    total = 0
+    carry = [0] * width
+    for ftotal, fcarry, _ in effects:
+        total += apply(ftotal, carry)
+        carry = [apply(f, carry) for f in fcarry]
+
+    return total
 
 
 def main():
-    with open(sys.argv[1], "r") as source:
-        result = countCards(source)
-        print(f"{result}")
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="worker processes; each does about W+1 times the serial work for"
+        " cards matching up to W numbers, so this only pays off with jobs well"
+        " above W",
+    )
+    parser.add_argument("filename")
+    args = parser.parse_args()
+
+    if args.jobs > 1:
+        result = parallelCountMatches(args.filename, args.jobs)
+    else:
+        result = countMatches(fileMatches(args.filename))
+    print(f"{result}")
 
 
 if __name__ == "__main__":
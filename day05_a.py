@@ -1,11 +1,20 @@
 #!/bin/env python3
 # vi:ai:sw=4 ts=4 et
+from __future__ import annotations
 
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
+from collections import defaultdict, deque
 from collections.abc import Iterable
+import itertools
+import operator
 import re
 import sys
-from typing import Dict, List, Optional, Tuple
+from typing import Deque, Dict, List, Optional, Tuple
+
+# past any value a map will ever see, to close off its identity pieces
+LOWEST = -(1 << 63)
+HIGHEST = 1 << 63
 
 
 class XtoYMap:
@@ -16,16 +25,128 @@ class XtoYMap:
         self.dest: str = m.group("to")
         self.ranges: List[Tuple[int, int, int]] = []
 
+        # ranges sorted by source, built on the first lookup after any change
+        self.indexed = False
+        self.starts = array("q")
+        self.ends = array("q")
+        self.offsets = array("q")
+        self.breaks: List[int] = []
+        self.shifts: List[int] = []
+
     def addRange(self, line: str):
         dstbegin, srcbegin, width = (int(i) for i in line.split(" "))
+        self.addMapping(dstbegin, srcbegin, width)
+
+    def addMapping(self, dstbegin: int, srcbegin: int, width: int):
         self.ranges.append((dstbegin, srcbegin, width))
+        self.indexed = False
+
+    def buildIndex(self):
+        ordered = sorted(self.ranges, key=lambda r: r[1])
+        self.starts = array("q", (src for dst, src, width in ordered))
+        self.ends = array("q", (src + width for dst, src, width in ordered))
+        self.offsets = array("q", (dst - src for dst, src, width in ordered))
+        self.indexed = True
+
+        # every piece, gaps too, so a bisection lands straight on its offset
+        pieces = list(self.pieces())
+        self.breaks = [begin for begin, end, offset in pieces[1:]]
+        self.shifts = [offset for begin, end, offset in pieces]
 
     def transform(self, value: int) -> int:
-        for dstbegin, srcbegin, width in self.ranges:
-            if srcbegin <= value and value <= srcbegin + width:
-                return dstbegin + (value - srcbegin)
+        """
+        >>> xy = XtoYMap("seed-to-soil map:")
+        >>> xy.addRange("50 98 2")
+        >>> xy.addRange("52 50 48")
+        >>> [xy.transform(v) for v in (79, 14, 55, 13, 97, 98, 99, 100)]
+        [81, 14, 57, 13, 99, 50, 51, 100]
+        """
+        if not self.indexed:
+            self.buildIndex()
+
+        # the source ranges don't overlap, so only the last to start can match
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value < self.ends[i]:
+            return value + self.offsets[i]
         return value
 
+    def transformBatch(self, values: Iterable[int]) -> array:
+        """transform for a whole batch, with all the per-value work in C
+
+        >>> xy = XtoYMap("seed-to-soil map:")
+        >>> xy.addRange("50 98 2")
+        >>> xy.addRange("52 50 48")
+        >>> list(xy.transformBatch([79, 14, 55, 13, 97, 98, 99, 100, 1 << 40]))
+        [81, 14, 57, 13, 99, 50, 51, 100, 1099511627776]
+        """
+        if not self.indexed:
+            self.buildIndex()
+
+        values = array("q", values)
+        where = map(bisect_right, itertools.repeat(self.breaks), values)
+        return array(
+            "q", map(operator.add, values, map(self.shifts.__getitem__, where))
+        )
+
+    def pieces(self) -> Iterable[Tuple[int, int, int]]:
+        """(begin, end, offset) for every value, gaps included with offset 0"""
+        if not self.indexed:
+            self.buildIndex()
+
+        cursor = LOWEST
+        for begin, end, offset in zip(self.starts, self.ends, self.offsets):
+            if cursor < begin:
+                yield (cursor, begin, 0)
+            yield (begin, end, offset)
+            cursor = end
+        yield (cursor, HIGHEST, 0)
+
+    def compose(self, after: XtoYMap) -> XtoYMap:
+        """One map doing the work of this one and then after
+
+        >>> xy = XtoYMap("seed-to-soil map:")
+        >>> xy.addRange("50 98 2")
+        >>> xy.addRange("52 50 48")
+        >>> yz = XtoYMap("soil-to-fertilizer map:")
+        >>> yz.addRange("0 15 37")
+        >>> yz.addRange("37 52 2")
+        >>> yz.addRange("39 0 15")
+        >>> xz = xy.compose(yz)
+        >>> xz.source, xz.dest
+        ('seed', 'fertilizer')
+        >>> all(xz.transform(v) == yz.transform(xy.transform(v)) for v in range(120))
+        True
+        """
+        later = list(after.pieces())
+        starts = [begin for begin, end, offset in later]
+
+        # (begin, end, offset) of every piece that moves, merged where they meet
+        moved: List[List[int]] = []
+        for begin, end, offset in self.pieces():
+            # split this piece's image wherever the later map's pieces change
+            cursor = begin + offset
+            i = bisect_right(starts, cursor) - 1
+            while cursor < end + offset:
+                _, stop, further = later[i]
+                stop = min(stop, end + offset)
+                total = offset + further
+                if total:
+                    if (
+                        moved
+                        and moved[-1][1] == cursor - offset
+                        and moved[-1][2] == total
+                    ):
+                        moved[-1][1] = stop - offset
+                    else:
+                        moved.append([cursor - offset, stop - offset, total])
+                cursor = stop
+                i += 1
+
+        composed = XtoYMap(f"{self.source}-to-{after.dest} map:")
+        for begin, end, offset in moved:
+            composed.addMapping(begin + offset, begin, end - begin)
+        return composed
+
 
 def parseMaps(source: Iterable[str]) -> List[XtoYMap]:
     maps: List[XtoYMap] = []
@@ -56,32 +177,69 @@ class MapGraph:
             graph[m.source].append(m)
 
         self.graph = graph
+        self.paths: Dict[Tuple[str, str], List[XtoYMap]] = {}
+        self.composed: Dict[Tuple[str, str], XtoYMap] = {}
 
     def findPath(self, source: str, destination: str) -> List[XtoYMap]:
-        # degenerate case
-        if source == destination:
-            return []
-
-        options = self.graph[source]
-        if len(options) == 0:
-            raise RuntimeError(f"no forward step from {source} towards {destination}")
-
-        # only one way forward
-        if len(options) == 1:
-            return [options[0]] + self.findPath(options[0].dest, destination)
-
-        # this is only OK because we're promised a DAG
-        paths: List[List[XtoYMap]] = []
-        for step in options:
-            try:
-                following = self.findPath(step.dest, destination)
-                paths.append([step] + following)
-            except RuntimeError:
-                pass  # one dead end is not a problem
-
-        path = min(paths, key=len)
+        """The shortest chain of maps from source to destination
+
+        Ties go to the maps listed first.  One breadth-first search finds the
+        way to everything reachable from source, and all of it is cached.
+
+        >>> graph = MapGraph([XtoYMap(h) for h in (
+        ...     "a-to-b map:", "b-to-c map:", "c-to-d map:", "b-to-d map:", "x-to-y map:")])
+        >>> [(m.source, m.dest) for m in graph.findPath("a", "d")]
+        [('a', 'b'), ('b', 'd')]
+        >>> graph.findPath("c", "c")
+        []
+        >>> graph.findPath("a", "y")
+        Traceback (most recent call last):
+        ...
+        RuntimeError: no path from a towards y
+        """
+        if (source, source) not in self.paths:
+            self.search(source)
+
+        path = self.paths.get((source, destination))
+        if path is None:
+            raise RuntimeError(f"no path from {source} towards {destination}")
         return path
 
+    def search(self, source: str):
+        self.paths[(source, source)] = []
+        queue: Deque[str] = deque([source])
+        while queue:
+            here = queue.popleft()
+            for step in self.graph.get(here, []):
+                if (source, step.dest) not in self.paths:
+                    self.paths[(source, step.dest)] = self.paths[(source, here)] + [
+                        step
+                    ]
+                    queue.append(step.dest)
+
+    def allPaths(self) -> Dict[Tuple[str, str], List[XtoYMap]]:
+        """Shortest paths between every pair of categories that are connected
+
+        >>> graph = MapGraph([XtoYMap(h) for h in ("a-to-b map:", "b-to-c map:")])
+        >>> sorted(f"{s}->{d}:{len(p)}" for (s, d), p in graph.allPaths().items())
+        ['a->a:0', 'a->b:1', 'a->c:2', 'b->b:0', 'b->c:1', 'c->c:0']
+        """
+        for m in self.maplist:
+            for category in (m.source, m.dest):
+                if (category, category) not in self.paths:
+                    self.search(category)
+        return self.paths
+
+    def composedMap(self, source: str, destination: str) -> XtoYMap:
+        """The whole of findPath as one map, composed once per pair"""
+        key = (source, destination)
+        if key not in self.composed:
+            composed = XtoYMap(f"{source}-to-{destination} map:")
+            for step in self.findPath(source, destination):
+                composed = composed.compose(step)
+            self.composed[key] = composed
+        return self.composed[key]
+
 
 def walkPath(value: int, path: List[XtoYMap]) -> int:
     for step in path:
@@ -91,7 +249,26 @@ def walkPath(value: int, path: List[XtoYMap]) -> int:
     return value
 
 
-def loadMapPath(source: str, destination: str, lines: List[str]) -> List[XtoYMap]:
+def walkPathBatch(seeds: Iterable[int], path: List[XtoYMap]) -> array:
+    """walkPath for many seeds at once, a whole stage at a time
+
+    A path of one composed map, from MapGraph.composedMap, needs just the
+    one stage.
+
+    >>> with open("day05-example-input.txt", "r") as source:
+    ...     lines = source.readlines()
+    >>> path = loadMapPath("seed", "location", lines[1:])
+    >>> seeds = [79, 14, 55, 13, 0, 1 << 33] + list(range(90, 110))
+    >>> list(walkPathBatch(seeds, path)) == [walkPath(seed, path) for seed in seeds]
+    True
+    """
+    values = array("q", seeds)
+    for step in path:
+        values = step.transformBatch(values)
+    return values
+
+
+def loadMapGraph(lines: List[str]) -> MapGraph:
     xys: List[XtoYMap] = []
     xy: Optional[XtoYMap] = None
 
@@ -106,7 +283,11 @@ def loadMapPath(source: str, destination: str, lines: List[str]) -> List[XtoYMap
             assert xy is not None
             xy.addRange(line)
 
-    graph = MapGraph(xys)
+    return MapGraph(xys)
+
+
+def loadMapPath(source: str, destination: str, lines: List[str]) -> List[XtoYMap]:
+    graph = loadMapGraph(lines)
     path = graph.findPath(source, destination)
     # print(f"path {[(s.source, s.dest) for s in path]}")
     return path
@@ -117,11 +298,10 @@ def seedLocations(source: List[str]) -> Iterable[int]:
     assert seedline[0] == "seeds:"
     seeds = [int(s) for s in seedline[1:]]
 
-    # build the graph
-    path = loadMapPath("seed", "location", source[1:])
+    # build the graph, and fold the path into one map
+    almanac = loadMapGraph(source[1:]).composedMap("seed", "location")
 
-    locations = [walkPath(seed, path) for seed in seeds]
-    return locations
+    return almanac.transformBatch(seeds)
 
 
 def main():
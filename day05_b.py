@@ -2,7 +2,7 @@
 # vi:ai:sw=4 ts=4 et
 from __future__ import annotations
 
-from day05_a import loadMapPath, XtoYMap
+from day05_a import loadMapGraph, XtoYMap
 
 from collections.abc import Iterable
 import sys
@@ -86,29 +86,49 @@ class Interval:
         return results
 
 
-def transformIntervals(source: List[Interval], xtoy: XtoYMap) -> List[Interval]:
-    mapranges = [(Interval(s, s + w), d) for d, s, w in xtoy.ranges]
-
-    curgen = source
-    nextgen: List[Interval] = []
-    for s in curgen:
-        for srange, dest in mapranges:
-            overlap = s.intersection(srange)
-            if overlap is None:
-                continue
+def coalesce(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort, dropping empty intervals and merging any that overlap or touch
 
-            offset = dest - srange.begin
-            nextgen.append(Interval(overlap.begin + offset, overlap.end + offset))
+    >>> [(i.begin, i.end) for i in coalesce(
+    ...     [Interval(5, 7), Interval(1, 3), Interval(2, 5), Interval(9, 9)])]
+    [(1, 7)]
+    """
+    merged: List[Interval] = []
+    for i in sorted(intervals, key=lambda i: i.begin):
+        if i.width() == 0:
+            continue
+        if merged and i.begin <= merged[-1].end:
+            merged[-1] = Interval(merged[-1].begin, max(merged[-1].end, i.end))
+        else:
+            merged.append(Interval(i.begin, i.end))
+    return merged
 
-            residue = s.difference(overlap)
-            if len(residue) >= 1:
-                s = residue[0]
-                if len(residue) == 2:
-                    curgen.append(residue[1])
-            else:
-                continue
 
-    return nextgen
+def transformIntervals(source: List[Interval], xtoy: XtoYMap) -> List[Interval]:
+    """Map intervals through one stage, in a single sweep over both in order
+
+    >>> xy = XtoYMap("seed-to-soil map:")
+    >>> xy.addRange("50 98 2")
+    >>> xy.addRange("52 50 48")
+    >>> [(i.begin, i.end) for i in transformIntervals(
+    ...     [Interval(79, 93), Interval(55, 68), Interval(90, 101)], xy)]
+    [(50, 52), (57, 70), (81, 101)]
+    """
+    result: List[Interval] = []
+
+    # the pieces cover every value, so nothing can fall through the gaps
+    pieces = iter(xtoy.pieces())
+    begin, end, offset = next(pieces)
+    for s in coalesce(source):
+        cursor = s.begin
+        while cursor < s.end:
+            while end <= cursor:
+                begin, end, offset = next(pieces)
+            stop = min(end, s.end)
+            result.append(Interval(cursor + offset, stop + offset))
+            cursor = stop
+
+    return coalesce(result)
 
 
 def seedLocations(source: List[str]) -> Iterable[int]:
@@ -118,12 +138,10 @@ def seedLocations(source: List[str]) -> Iterable[int]:
     seedPairs = zip(seedraws[0::2], seedraws[1::2])
     seeds = [Interval(s[0], s[0] + s[1]) for s in seedPairs]
 
-    # build the graph
-    path = loadMapPath("seed", "location", source[1:])
+    # build the graph, and fold the path into one map
+    almanac = loadMapGraph(source[1:]).composedMap("seed", "location")
 
-    locations = seeds
-    for step in path:
-        locations = transformIntervals(locations, step)
+    locations = transformIntervals(seeds, almanac)
 
     return (i.begin for i in locations)
 
@@ -0,0 +1,100 @@
+# vi:ai:sw=4 ts=4 et
+
+from array import array
+from collections.abc import Iterable
+import itertools
+import operator
+import re
+from typing import List
+
+
+def cellTable(test) -> bytes:
+    """translate() table mapping every byte to 1 if it passes test, else 0"""
+    return bytes(1 if test(b) else 0 for b in range(256))
+
+
+DIGIT_CELLS = cellTable(lambda b: b in b"0123456789")
+SYMBOL_CELLS = cellTable(lambda b: b not in b" .0123456789")
+NUMBER = re.compile(rb"\d+")
+GEAR = re.compile(rb"\*")
+
+
+class Grid:
+    """A whole schematic as one byte per cell, worked on in bulk
+
+    Rows are padded with a blank column, and the grid with a blank row above
+    and below, so no neighbour of a real cell falls off an edge or wraps onto
+    the next row.  A mask is an int holding a 0 or 1 byte per cell: shifting
+    it by 8 moves every cell one column, by 8 * width one row.
+    """
+
+    def __init__(self, source: Iterable[str]):
+        lines = [line.strip() for line in source]
+        self.width = max(map(len, lines), default=0) + 1
+        blank = "." * self.width
+        rows = [blank] + [line.ljust(self.width, ".") for line in lines] + [blank]
+        self.cells = "".join(rows).encode()
+
+        self.data = int.from_bytes(self.cells, "little")
+        self.digits = int.from_bytes(self.cells.translate(DIGIT_CELLS), "little")
+        self.symbols = int.from_bytes(self.cells.translate(SYMBOL_CELLS), "little")
+        self.full = (1 << (8 * len(self.cells))) - 1
+
+    def dilate(self, mask: int) -> int:
+        """Grow every marked cell over its 3x3 neighbourhood"""
+        column = 8
+        row = 8 * self.width
+        mask |= (mask << column) | (mask >> column)
+        mask |= (mask << row) | (mask >> row)
+        return mask & self.full
+
+    def spread(self, mask: int) -> int:
+        """Grow marked digits along their runs until whole numbers are marked"""
+        while True:
+            grown = mask | (((mask << 8) | (mask >> 8)) & self.digits)
+            if grown == mask:
+                return mask
+            mask = grown
+
+    def partnums(self) -> int:
+        """
+        >>> with open("day03-a-example-input.txt", "r") as source:
+        ...     Grid(source).partnums()
+        4361
+        """
+        marked = self.spread(self.dilate(self.symbols) & self.digits)
+
+        # spreading 0/1 bytes to 0/255 keeps just the part numbers' digits
+        kept = self.data & (marked * 0xFF)
+        return sum(map(int, NUMBER.findall(kept.to_bytes(len(self.cells), "little"))))
+
+    def labels(self) -> array:
+        """Each digit cell's number, counting from 1, and 0 for other cells"""
+        digits = self.digits.to_bytes(len(self.cells), "little")
+        starts = (self.digits & ~(self.digits << 8)).to_bytes(len(self.cells), "little")
+        return array("q", map(operator.mul, itertools.accumulate(starts), digits))
+
+    def gearRatios(self) -> int:
+        """
+        >>> with open("day03-a-example-input.txt", "r") as source:
+        ...     Grid(source).gearRatios()
+        467835
+        """
+        labels = self.labels()
+        values: List[int] = [0] + list(map(int, NUMBER.findall(self.cells)))
+        gears = [m.start() for m in GEAR.finditer(self.cells)]
+
+        # gather the labels around every gear, one neighbour offset at a time
+        w = self.width
+        columns = [
+            map(labels.__getitem__, map(operator.add, gears, itertools.repeat(offset)))
+            for offset in (-w - 1, -w, -w + 1, -1, 1, w - 1, w, w + 1)
+        ]
+
+        ratios = 0
+        for hood in map(set, zip(*columns)):
+            hood.discard(0)
+            if len(hood) == 2:
+                first, second = hood
+                ratios += values[first] * values[second]
+        return ratios
@@ -0,0 +1,72 @@
+# vi:ai:sw=4 ts=4 et
+
+from collections.abc import Callable
+import math
+import multiprocessing
+import os
+from typing import List, Optional, Tuple
+
+SHARD_SIZE = 64 << 20
+SHARDS_PER_JOB = 4
+
+
+def shard_ranges(filename: str, size: int = SHARD_SIZE) -> List[Tuple[int, int]]:
+    """Split a file into (begin, end) byte ranges of about size bytes
+
+    Every range but the last ends just after a newline, so no line is split.
+
+    >>> shard_ranges("day01-a-example-input.txt", 8)
+    [(0, 18), (18, 30), (30, 41)]
+    """
+    total = os.path.getsize(filename)
+    ranges: List[Tuple[int, int]] = []
+
+    with open(filename, "rb") as source:
+        begin = 0
+        while begin < total:
+            end = begin + size
+            if end >= total:
+                end = total
+            else:
+                source.seek(end - 1)
+                source.readline()  # run on to the end of this line
+                end = source.tell()
+            ranges.append((begin, end))
+            begin = end
+
+    return ranges
+
+
+def shard_size(filename: str, jobs: Optional[int] = None) -> int:
+    """Small enough that every worker gets a few shards, to balance the load
+
+    >>> shard_size("day01-a-example-input.txt", 2)
+    6
+    """
+    workers = jobs or os.cpu_count() or 1
+    total = os.path.getsize(filename)
+    return max(1, min(SHARD_SIZE, math.ceil(total / (workers * SHARDS_PER_JOB))))
+
+
+def read_shard(shard: Tuple[str, int, int]) -> bytes:
+    filename, begin, end = shard
+    with open(filename, "rb") as source:
+        source.seek(begin)
+        return source.read(end - begin)
+
+
+def parallel_sum(
+    filename: str,
+    summer: Callable[[Tuple[str, int, int]], int],
+    jobs: Optional[int] = None,
+    size: Optional[int] = None,
+) -> int:
+    """Sum a file shard by shard across a pool of worker processes
+
+    Unless size is given, shards are sized so each worker gets a few.
+    """
+    if size is None:
+        size = shard_size(filename, jobs)
+    shards = [(filename, begin, end) for begin, end in shard_ranges(filename, size)]
+    with multiprocessing.Pool(jobs) as pool:
+        return sum(pool.imap_unordered(summer, shards))
@@ -0,0 +1,39 @@
+# vi:ai:sw=4 ts=4 et
+from day03_a import partnums
+from day03_b import gearRatios
+from grid_03 import Grid
+
+
+def check(lines):
+    grid = Grid(lines)
+    assert grid.partnums() == partnums(lines)
+    assert grid.gearRatios() == gearRatios(lines)
+
+
+def test_example():
+    with open("day03-a-example-input.txt", "r") as source:
+        check(source.readlines())
+
+
+def test_input():
+    with open("day03-a-input.txt", "r") as source:
+        check(source.readlines())
+
+
+def test_edges():
+    # numbers and gears touching every border, and ragged rows
+    check(["12*3", "*..4", "5.*", "6*78"])
+    check(["1*2.", "....", "3"])
+    check([])
+
+
+def test_one_gear():
+    check(["2*3"])
+    assert Grid(["2*3"]).gearRatios() == 6
+
+
+if __name__ == "__main__":
+    test_example()
+    test_input()
+    test_edges()
+    test_one_gear()
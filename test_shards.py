@@ -0,0 +1,40 @@
+# vi:ai:sw=4 ts=4 et
+import os
+import tempfile
+
+from shards import parallel_sum, read_shard, shard_ranges, shard_size
+
+
+def count_lines(shard):
+    return read_shard(shard).count(b"\n")
+
+
+def test_ranges():
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "lines.txt")
+        data = b"".join(b"x" * (i % 7) + b"\n" for i in range(100)) + b"tail"
+        with open(filename, "wb") as sink:
+            sink.write(data)
+
+        for size in (1, 5, 64, len(data), 2 * len(data)):
+            ranges = shard_ranges(filename, size)
+            assert b"".join(read_shard((filename, b, e)) for b, e in ranges) == data
+            for begin, end in ranges[:-1]:
+                assert data[end - 1 : end] == b"\n"
+
+
+def test_size():
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "lines.txt")
+        with open(filename, "wb") as sink:
+            sink.write(b"abc\n" * 1000)
+
+        assert shard_size(filename, 1) == 1000
+        assert shard_size(filename, 10) == 100
+        assert shard_size(filename, 10000) == 1
+        assert parallel_sum(filename, count_lines, jobs=2) == 1000
+
+
+if __name__ == "__main__":
+    test_ranges()
+    test_size()
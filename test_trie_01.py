@@ -1,5 +1,9 @@
 # vi:ai:sw=4 ts=4 et
-from trie_01 import Trie, Searcher
+import os
+import random
+import tempfile
+
+from trie_01 import Automaton, CompiledIterator, CompiledTrie, Trie, Searcher
 
 
 def test_trivial():
@@ -78,8 +82,256 @@ def test_search():
     assert s.value() == ("abra", 2)
 
 
+def test_automaton():
+    t = Trie("abba", 1)
+    t.add("abra", 2)
+    t.add("cadabra", 3)
+
+    a = Automaton(t)
+    state = 0
+    for c in "abb":
+        state = a.advance(state, c)
+        assert a.value(state) is None
+    state = a.advance(state, "a")
+    assert a.value(state) == ("abba", 1)
+
+    assert list(a.matches("abrupt cadaver abbreviated abra")) == [("abra", 2)]
+    assert list(a.matches("cadabracadabra")) == [("cadabra", 3), ("cadabra", 3)]
+
+
+def test_automaton_overlapping():
+    t = Trie()
+    for key, value in (("one", 1), ("two", 2), ("eight", 8), ("1", 1)):
+        t.add(key, value)
+
+    for text in ("oneight", "twone", "xtwoneightwo1", "ooneeight"):
+        s = Searcher(t)
+        expected = []
+        for c in text:
+            s.advance(c)
+            okv = s.value()
+            if okv is not None:
+                expected.append(okv[1])
+        assert [v for k, v in Automaton(t).matches(text)] == expected
+
+    assert list(Automaton(t).matches("oneight")) == [("one", 1), ("eight", 8)]
+
+
+def test_automaton_table():
+    t = Trie("abba", 1)
+    t.add("abra", 2)
+    t.add("cadabra", 3)
+
+    a = Automaton(t)
+    table = a.table()
+    for state in range(len(a.goto)):
+        for token in "abcdrx":
+            assert table[state * 256 + ord(token)] == a.advance(state, token)
+
+
+def test_single_character():
+    t = Trie()
+    t.add("one", 1)
+    t.add("1", 1)
+    assert ("1" in t) is True
+    assert t["1"] == 1
+    assert ("" in t) is False
+
+
+def test_freeze():
+    t = Trie("abba", 1)
+    t.add("abra", 2)
+    t.add("cadabra", 3)
+    t.add("dab", 4)
+
+    f = t.freeze()
+    assert len(f) == 4
+    for key, value in t.items():
+        assert (key in f) is True
+        assert f[key] == value
+    for key in ("", "a", "ab", "abb", "abbax", "cad", "x"):
+        assert (key in f) is False
+
+    try:
+        f["abr"]
+        assert False
+    except KeyError as e:
+        assert e.args == ("abr",)
+
+
+def test_freeze_shared_tail():
+    # the compressed "a" stays on the root, beside the "a" branch
+    t = Trie()
+    t.add("a", 1)
+    t.add("az", 2)
+    t.add("b", 3)
+
+    f = t.freeze()
+    assert len(f) == 3
+    assert f["a"] == 1
+    assert f["az"] == 2
+    assert f["b"] == 3
+    assert ("" in f) is False
+    assert ("z" in f) is False
+
+
+def test_compiled_iterator():
+    t = Trie("abba", 1)
+    t.add("abra", 2)
+    t.add("cadabra", 3)
+    f = t.freeze()
+
+    i = CompiledIterator(f)
+    for c in "abr":
+        assert i.advance(c) is True
+        assert i.value() is None
+    assert i.advance("a") is True
+    assert i.value() == 2
+    assert i.key() == "abra"
+    assert i.advance("a") is False
+
+    i = CompiledIterator(f)
+    assert i.advance("c") is True
+    assert i.advance("x") is False
+
+
+def test_save_load():
+    t = Trie("abba", 1)
+    t.add("abra", 2)
+    t.add("cadabra", 3)
+    t.add("zap", 4)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "trie.bin")
+        t.freeze().save(filename)
+
+        with CompiledTrie.load(filename) as m:
+            assert len(m) == 4
+            for key, value in t.items():
+                assert (key in m) is True
+                assert m[key] == value
+            assert ("abr" in m) is False
+
+            s = Searcher(m)
+            for c in "abrupt cadaver abbreviated cadabr":
+                s.advance(c)
+                assert s.value() is None
+            s.advance("a")
+            assert s.value() == ("cadabra", 3)
+
+        assert m.buffer is None
+        m.close()  # a second close does nothing
+
+
+def test_load_rejects_damage():
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "trie.bin")
+        Trie("abracadabra", 1).freeze().save(filename)
+        with open(filename, "rb") as source:
+            saved = source.read()
+
+        for damaged in (saved[:-1], saved[:-8], saved + b"\0" * 8, saved[:40]):
+            with open(filename, "wb") as sink:
+                sink.write(damaged)
+            try:
+                CompiledTrie.load(filename)
+                assert False
+            except ValueError:
+                pass
+
+
+def test_save_rejects_objects():
+    try:
+        Trie("abba", [1]).freeze().save(os.devnull)
+        assert False
+    except TypeError:
+        pass
+
+
+def test_from_sorted():
+    # prefix-free keys, which incremental add handles
+    rng = random.Random(1)
+    items = [("".join(rng.choices("abc", k=8)), i) for i in range(500)]
+    incremental = Trie()
+    for key, value in dict(items).items():
+        incremental.add(key, value)
+    bulk = Trie.from_items(items)
+    for key, value in dict(items).items():
+        assert bulk[key] == incremental[key] == value
+    assert sorted(bulk.items()) == sorted(incremental.items())
+
+    # keys that are prefixes of each other, including the empty key
+    items = [("".join(rng.choices("ab", k=rng.randint(0, 6))), i) for i in range(200)]
+    bulk = Trie.from_items(items)
+    assert sorted(bulk.items()) == sorted(dict(items).items())
+    for key, value in dict(items).items():
+        assert bulk[key] == value
+    assert Automaton(bulk).value(0) == ("", dict(items)[""])
+
+    try:
+        Trie.from_sorted([("b", 1), ("a", 2)])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_prefix_items():
+    rng = random.Random(2)
+    items = dict(
+        ("".join(rng.choices("abc", k=rng.randint(1, 6))), i) for i in range(300)
+    )
+    t = Trie.from_items(items.items())
+    for prefix in ("", "a", "ab", "cab", "abcabc", "abcabca", "x"):
+        expected = sorted((k, v) for k, v in items.items() if k.startswith(prefix))
+        assert sorted(t.items(prefix)) == expected
+        assert sorted(t.keys(prefix)) == [k for k, v in expected]
+
+    # the prefix ends inside a compressed key
+    t = Trie("abracadabra", 1)
+    t.add("b", 2)
+    assert list(t.items("abra")) == [("abracadabra", 1)]
+    assert list(t.keys("abrx")) == []
+
+
+def test_longest_prefix():
+    t = Trie.from_items([("a", 1), ("ab", 2), ("abcd", 4), ("b", 5), ("bcd", 6)])
+    assert t.longest_prefix("abcdx") == (4, 4)
+    assert t.longest_prefix("abcx") == (2, 2)
+    assert t.longest_prefix("xabc") is None
+    assert t.longest_prefix("xabc", 1) == (3, 2)
+
+    # greedy longest-match segmentation
+    text = "abcdbcdab"
+    pieces = []
+    pos = 0
+    while pos < len(text):
+        match = t.longest_prefix(text, pos)
+        assert match is not None
+        end, value = match
+        pieces.append(value)
+        pos = end
+    assert pieces == [4, 6, 2]
+
+    t = Trie("abracadabra", 1)
+    assert t.longest_prefix("abracadabra!") == (11, 1)
+    assert t.longest_prefix("abracad") is None
+
+
 if __name__ == "__main__":
     test_trivial()
     test_forked()
     test_rooted()
     test_search()
+    test_automaton()
+    test_automaton_overlapping()
+    test_automaton_table()
+    test_single_character()
+    test_freeze()
+    test_freeze_shared_tail()
+    test_compiled_iterator()
+    test_save_load()
+    test_load_rejects_damage()
+    test_save_rejects_objects()
+    test_from_sorted()
+    test_prefix_items()
+    test_longest_prefix()
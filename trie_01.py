@@ -1,7 +1,13 @@
 # vi:ai:sw=4 ts=4 et
 
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Iterable
+import itertools
 import json
-from typing import Any, Dict, List, Optional, Tuple
+import mmap
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple, Union
 
 
 class Trie:
@@ -10,6 +16,58 @@ class Trie:
         self.value = value
         self.children: Dict[str, Trie] = {}
 
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[str, Any]]) -> "Trie":
+        """Build a trie in bulk, sorting the keys once; later duplicates win"""
+        return cls.from_sorted(sorted(dict(items).items()))
+
+    @classmethod
+    def from_sorted(cls, items: Iterable[Tuple[str, Any]]) -> "Trie":
+        """Build a trie in one pass over (key, value) pairs in ascending order
+
+        Each key only needs explicit nodes as deep as it shares a prefix with
+        either neighbour; the rest of it becomes one compressed leaf.  So the
+        trie is built without ever expanding a compressed key, in time linear
+        in the total length of the keys.
+        """
+        root = cls()
+        path: List[Trie] = [root]  # path[j] holds the prefix key[:j]
+
+        def common(a: str, b: str) -> int:
+            n = 0
+            for x, y in zip(a, b):
+                if x != y:
+                    break
+                n += 1
+            return n
+
+        pending: Optional[Tuple[str, Any]] = None
+        shared = 0  # with the previous key
+        for item in itertools.chain(items, [None]):
+            if pending is not None:
+                key, value = pending
+                following = 0 if item is None else common(key, item[0])
+                if item is not None and item[0] <= key:
+                    raise ValueError(f"keys out of order: {key!r}, {item[0]!r}")
+
+                depth = max(shared, following)
+                del path[shared + 1 :]
+                for j in range(shared, depth):
+                    node = cls()
+                    path[j].children[key[j]] = node
+                    path.append(node)
+
+                if depth == len(key):
+                    path[depth].value = value
+                else:
+                    path[depth].children[key[depth]] = cls(key[depth + 1 :], value)
+
+                shared = following
+
+            pending = item
+
+        return root
+
     def add(self, key: str, value: Any):
         # attach a value to this node
         if len(key) == 0:
@@ -42,6 +100,10 @@ class Trie:
         if key == self.key:
             return self.value
 
+        # a value stored without a compressed key belongs to this node itself
+        if len(key) == 0 and self.key is None and self.value is not None:
+            return self.value
+
         try:
             if len(key) > 0 and key[0] in self.children:
                 child = self.children[key[0]]
@@ -59,6 +121,70 @@ class Trie:
 
         return True
 
+    def items(self, prefix: str = "") -> Iterable[Tuple[str, Any]]:
+        """Lazily yield every (key, value) pair whose key starts with prefix
+
+        Only the subtree under prefix is visited, in no particular order.
+        """
+        node = self
+        depth = 0
+        while depth < len(prefix):
+            # a compressed key can run on past the rest of the prefix
+            if node.key is not None and node.value is not None:
+                if node.key.startswith(prefix[depth:]):
+                    yield (prefix[:depth] + node.key, node.value)
+
+            child = node.children.get(prefix[depth])
+            if child is None:
+                return
+            node = child
+            depth += 1
+
+        stack: List[Tuple[Trie, str]] = [(node, prefix)]
+        while stack:
+            node, prefix = stack.pop()
+            if node.value is not None:
+                yield (prefix if node.key is None else prefix + node.key, node.value)
+            for token, child in node.children.items():
+                stack.append((child, prefix + token))
+
+    def keys(self, prefix: str = "") -> Iterable[str]:
+        return (key for key, value in self.items(prefix))
+
+    def longest_prefix(self, text: str, start: int = 0) -> Optional[Tuple[int, Any]]:
+        """(end, value) for the longest key matching text from start onwards
+
+        Walks a single path down the trie, so repeatedly taking the longest
+        match segments a string without trying every candidate length.
+        """
+        longest: Optional[Tuple[int, Any]] = None
+        node = self
+        pos = start
+        while True:
+            if node.value is not None:
+                if node.key is None:
+                    end = pos
+                elif text.startswith(node.key, pos):
+                    end = pos + len(node.key)
+                else:
+                    end = -1
+                if end >= 0 and (longest is None or end > longest[0]):
+                    longest = (end, node.value)
+
+            if pos == len(text):
+                return longest
+            child = node.children.get(text[pos])
+            if child is None:
+                return longest
+            node = child
+            pos += 1
+
+    def iterator(self) -> "Iterator":
+        return Iterator(self)
+
+    def freeze(self) -> "CompiledTrie":
+        return CompiledTrie(self)
+
     def toJSON(self) -> Dict:
         children = dict((k, v.toJSON()) for k, v in self.children.items())
         return {"key": self.key, "value": self.value, "children": children}
@@ -107,13 +233,13 @@ class Iterator:
 
 
 class Searcher:
-    def __init__(self, root: Trie):
+    def __init__(self, root: Union[Trie, "CompiledTrie"]):
         self.root = root
-        self.echelon: List[Iterator] = []
+        self.echelon: List[Union[Iterator, CompiledIterator]] = []
 
     def advance(self, token: str):
         next_echelon = [i for i in self.echelon if i.advance(token)]
-        begin = Iterator(self.root)
+        begin = self.root.iterator()
         if begin.advance(token):
             next_echelon.append(begin)
         self.echelon = next_echelon
@@ -124,3 +250,366 @@ class Searcher:
             if ov is not None:
                 return (i.key(), ov)
         return None
+
+
+class Automaton:
+    """Aho-Corasick automaton over every key in a trie
+
+    Each prefix of a key is a state; failure links point at the longest
+    proper suffix that is also a state, so scanning a character is O(1)
+    amortized and never allocates.  The output of a state is the longest
+    key ending there, the same match a Searcher would report.
+    """
+
+    def __init__(self, root: Trie):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Optional[Tuple[str, Any]]] = [None]
+
+        # one state per prefix of every key
+        for key, value in root.items():
+            state = 0
+            for token in key:
+                state = self.extend(state, token)
+            self.output[state] = (key, value)
+
+        # breadth first, so shallower failure links are always ready
+        queue: Deque[int] = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, target in self.goto[state].items():
+                queue.append(target)
+                self.fail[target] = self.advance(self.fail[state], token)
+                if self.output[target] is None:
+                    self.output[target] = self.output[self.fail[target]]
+
+    def extend(self, state: int, token: str) -> int:
+        transitions = self.goto[state]
+        if token not in transitions:
+            transitions[token] = len(self.goto)
+            self.goto.append({})
+            self.fail.append(0)
+            self.output.append(None)
+        return transitions[token]
+
+    def advance(self, state: int, token: str) -> int:
+        goto = self.goto
+        fail = self.fail
+        while state and token not in goto[state]:
+            state = fail[state]
+        return goto[state].get(token, 0)
+
+    def value(self, state: int) -> Optional[Tuple[str, Any]]:
+        return self.output[state]
+
+    def table(self, width: int = 256) -> array:
+        """Dense transitions, table[state * width + code] for every code < width
+
+        This trades memory for a single index per token, eg. scanning bytes.
+        """
+        table = array("q", bytes(8 * width * len(self.goto)))
+
+        # breadth first, so each row can start as a copy of its failure row
+        queue: Deque[int] = deque([0])
+        while queue:
+            state = queue.popleft()
+            base = state * width
+            if state:
+                fail = self.fail[state] * width
+                table[base : base + width] = table[fail : fail + width]
+            for token, target in self.goto[state].items():
+                if ord(token) < width:
+                    table[base + ord(token)] = target
+                queue.append(target)
+
+        return table
+
+    def matches(self, source: Iterable[str]) -> Iterable[Tuple[str, Any]]:
+        """Yield (key, value) for every position where a key ends"""
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+        for token in source:
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            okv = output[state]
+            if okv is not None:
+                yield okv
+
+
+# a position in a Trie: a node, or None past the end of one, plus the
+# compressed keys still running on through it, as (rest, value)
+Position = Tuple[Optional[Trie], List[Tuple[str, Any]]]
+
+
+class CompiledTrie:
+    """Read-only radix trie flattened into contiguous arrays
+
+    Node i owns the edges first[i]:first[i + 1], whose tokens are sorted so a
+    child is found by bisection.  The label leading into node i, including
+    its edge token, is pool[label[i]:label[i + 1]] as code points, and
+    slot[i] indexes its value in values, or is -1 for a purely internal node.
+
+    Since every field is a flat array of integers, a trie with integer
+    values can be saved and later answered straight from a mapped file.
+    """
+
+    MAGIC = b"TRIE\x00\x00\x00\x01"
+    BYTEORDER = 0x0102030405060708  # reads back scrambled on a foreign host
+
+    first: Sequence[int]
+    tokens: Sequence[int]
+    targets: Sequence[int]
+    label: Sequence[int]
+    slot: Sequence[int]
+    pool: Sequence[int]
+    values: Sequence[Any]
+    buffer: Optional[mmap.mmap]
+
+    def __init__(self, root: Trie):
+        first = array("q", [0])
+        tokens = array("I")
+        targets = array("q")
+        label = array("q", [0, 0])
+        slot = array("q")
+        pool = array("I")
+        values: List[Any] = []
+
+        # breadth first over the Trie's own nodes, so a compressed key goes
+        # straight into the pool, and each chain of unary, valueless nodes
+        # is collapsed into one label
+        queue: Deque[Tuple[Position, Any]] = deque()
+        queue.append(((root, []), CompiledTrie._own(root, [])))
+        while queue:
+            position, value = queue.popleft()
+            slot.append(-1 if value is None else len(values))
+            if value is not None:
+                values.append(value)
+
+            following = CompiledTrie._branches(*position)
+            for token in sorted(following):
+                tokens.append(ord(token))
+                targets.append(len(label) - 1)
+                pool.append(ord(token))
+                queue.append(CompiledTrie._collapse(following[token], pool))
+                label.append(len(pool))
+            first.append(len(tokens))
+
+        self.first = first
+        self.tokens = tokens
+        self.targets = targets
+        self.label = label
+        self.slot = slot
+        self.pool = pool
+        self.values = values
+        self.buffer = None
+
+    @staticmethod
+    def _branches(node: Optional[Trie], tails: List[Tuple[str, Any]]):
+        result: Dict[str, Position] = {}
+        if node is not None:
+            for token, child in node.children.items():
+                result[token] = (child, [])
+            if node.key is not None and node.value is not None:
+                tails = tails + [(node.key, node.value)]
+        for key, value in tails:
+            if key:  # usually a branch of its own, but it may share one
+                result.setdefault(key[0], (None, []))[1].append((key[1:], value))
+        return result
+
+    @staticmethod
+    def _own(node: Optional[Trie], tails: List[Tuple[str, Any]]) -> Any:
+        if node is not None and node.key is None and node.value is not None:
+            return node.value
+        for key, value in tails:
+            if not key:
+                return value
+        return None
+
+    @staticmethod
+    def _collapse(position: Position, pool: array) -> Tuple[Position, Any]:
+        """Follow a chain of unary, valueless positions, extending the label"""
+        node, tails = position
+        while True:
+            if node is None and len(tails) == 1:  # a leaf
+                rest, value = tails[0]
+                pool.extend(map(ord, rest))
+                return ((None, [("", value)]), value)
+            value = CompiledTrie._own(node, tails)
+            if value is not None:
+                return ((node, tails), value)
+            following = CompiledTrie._branches(node, tails)
+            if len(following) != 1:
+                return ((node, tails), None)
+            ((token, (node, tails)),) = following.items()
+            pool.append(ord(token))
+
+    def save(self, filename: str):
+        """Write the arrays out, int64 sections first so all stay aligned"""
+        if not all(isinstance(v, int) for v in self.values):
+            raise TypeError("only integer values can be saved")
+
+        sections = [
+            array("q", self.first),
+            array("q", self.targets),
+            array("q", self.label),
+            array("q", self.slot),
+            array("q", self.values),
+            array("I", self.tokens),
+            array("I", self.pool),
+        ]
+        header = array("q", [CompiledTrie.BYTEORDER] + [len(a) for a in sections])
+
+        with open(filename, "wb") as sink:
+            sink.write(CompiledTrie.MAGIC)
+            header.tofile(sink)
+            for section in sections:
+                section.tofile(sink)
+
+    @classmethod
+    def load(cls, filename: str) -> "CompiledTrie":
+        """Map a saved trie, answering queries from the page cache until closed"""
+        with open(filename, "rb") as source:
+            buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # only the sections stay exported, so closing them frees the mapping
+        sections: List[memoryview] = []
+        try:
+            with memoryview(buffer) as view:
+                offset = len(cls.MAGIC) + 8 * 8
+                if len(view) < offset or view[: len(cls.MAGIC)] != cls.MAGIC:
+                    raise ValueError(f"{filename} is not a saved trie")
+                with view[len(cls.MAGIC) : offset].cast("q") as header:
+                    counts = header.tolist()
+                if counts[0] != cls.BYTEORDER:
+                    raise ValueError(f"{filename} was saved with another byte order")
+
+                for i, count in enumerate(counts[1:]):
+                    wide = i < 5  # the int64 sections come first
+                    size = count * (8 if wide else array("I").itemsize)
+                    if offset + size > len(view):
+                        raise ValueError(f"{filename} is truncated")
+                    with view[offset : offset + size] as section:
+                        sections.append(section.cast("q" if wide else "I"))
+                    offset += size
+
+                if offset != len(view):
+                    raise ValueError(f"{filename} has trailing bytes")
+        except BaseException:
+            for section in sections:
+                section.release()
+            buffer.close()
+            raise
+
+        trie = cls.__new__(cls)
+        trie.buffer = buffer
+        (
+            trie.first,
+            trie.targets,
+            trie.label,
+            trie.slot,
+            trie.values,
+            trie.tokens,
+            trie.pool,
+        ) = sections
+        return trie
+
+    def __enter__(self) -> "CompiledTrie":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap a loaded trie, which can't answer queries afterwards"""
+        if self.buffer is None:
+            return
+        sections = [self.first, self.targets, self.label, self.slot, self.values]
+        for section in sections + [self.tokens, self.pool]:
+            if isinstance(section, memoryview):
+                section.release()
+        self.buffer.close()
+        self.buffer = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def iterator(self) -> "CompiledIterator":
+        return CompiledIterator(self)
+
+    def child(self, node: int, token: str) -> int:
+        lo = self.first[node]
+        hi = self.first[node + 1]
+        code = ord(token)
+        i = bisect_left(self.tokens, code, lo, hi)
+        if i < hi and self.tokens[i] == code:
+            return self.targets[i]
+        return -1
+
+    def find(self, key: str) -> int:
+        """The node reached by consuming exactly key, or -1"""
+        label = self.label
+        pool = self.pool
+        node = 0
+        pos = 0
+        while pos < len(key):
+            node = self.child(node, key[pos])
+            if node < 0:
+                return -1
+            begin = label[node]
+            end = label[node + 1]
+            if end - begin > len(key) - pos:
+                return -1
+            for i in range(1, end - begin):
+                if pool[begin + i] != ord(key[pos + i]):
+                    return -1
+            pos += end - begin
+        return node
+
+    def __getitem__(self, key: str):
+        node = self.find(key)
+        if node < 0 or self.slot[node] < 0:
+            raise KeyError(key)
+        return self.values[self.slot[node]]
+
+    def __contains__(self, key: str):
+        node = self.find(key)
+        return node >= 0 and self.slot[node] >= 0
+
+
+class CompiledIterator:
+    """The Iterator interface, walking a CompiledTrie"""
+
+    def __init__(self, root: CompiledTrie):
+        self.root = root
+        self.prefix: List[str] = []
+        self.node = 0
+        self.offset = 0  # position in root.pool, at the end of the label
+
+    def advance(self, token: str) -> bool:
+        root = self.root
+        if self.offset < root.label[self.node + 1]:  # inside a label
+            if root.pool[self.offset] != ord(token):
+                return False
+            self.offset += 1
+        else:
+            child = root.child(self.node, token)
+            if child < 0:
+                return False
+            self.node = child
+            self.offset = root.label[child] + 1
+
+        self.prefix.append(token)
+        return True
+
+    def value(self) -> Optional[Any]:
+        root = self.root
+        if self.offset < root.label[self.node + 1]:
+            return None
+        slot = root.slot[self.node]
+        return None if slot < 0 else root.values[slot]
+
+    def key(self) -> str:
+        return "".join(self.prefix)